@@ -0,0 +1,243 @@
+"""Batched EDI file reads via io_uring.
+
+Optional backend for the agents' CLI loops: instead of one open/read/close
+round-trip per file, paths are processed in chunks of up to ``QUEUE_DEPTH``
+and every phase (openat, read, close) of a chunk is submitted and reaped with
+a single ``io_uring_submit_and_wait`` call.
+
+Talks to liburing's FFI build (``liburing-ffi.so``, liburing >= 2.4) through
+ctypes, so no extra Python package is required. On non-Linux hosts, when the
+library is missing, or when the kernel refuses to set up a ring, ``read_files``
+falls back to plain ``open().read()``.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import sys
+
+QUEUE_DEPTH = 64
+AT_FDCWD = -100
+
+# struct io_uring is opaque to us; liburing's is ~220 bytes, leave headroom.
+_RING_SIZE = 1024
+
+
+class _Cqe(ctypes.Structure):
+    _fields_ = [
+        ("user_data", ctypes.c_uint64),
+        ("res", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+    ]
+
+
+def _load_liburing():
+    if not sys.platform.startswith("linux"):
+        return None
+    name = ctypes.util.find_library("uring-ffi")
+    if not name:
+        return None
+    try:
+        lib = ctypes.CDLL(name)
+    except OSError:
+        return None
+
+    vp = ctypes.c_void_p
+    lib.io_uring_queue_init.argtypes = [ctypes.c_uint, vp, ctypes.c_uint]
+    lib.io_uring_queue_init.restype = ctypes.c_int
+    lib.io_uring_queue_exit.argtypes = [vp]
+    lib.io_uring_queue_exit.restype = None
+    lib.io_uring_get_sqe.argtypes = [vp]
+    lib.io_uring_get_sqe.restype = vp
+    lib.io_uring_prep_openat.argtypes = [vp, ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_uint]
+    lib.io_uring_prep_openat.restype = None
+    lib.io_uring_prep_read.argtypes = [vp, ctypes.c_int, vp, ctypes.c_uint, ctypes.c_uint64]
+    lib.io_uring_prep_read.restype = None
+    lib.io_uring_prep_close.argtypes = [vp, ctypes.c_int]
+    lib.io_uring_prep_close.restype = None
+    lib.io_uring_sqe_set_data64.argtypes = [vp, ctypes.c_uint64]
+    lib.io_uring_sqe_set_data64.restype = None
+    lib.io_uring_submit_and_wait.argtypes = [vp, ctypes.c_uint]
+    lib.io_uring_submit_and_wait.restype = ctypes.c_int
+    lib.io_uring_wait_cqe.argtypes = [vp, ctypes.POINTER(ctypes.POINTER(_Cqe))]
+    lib.io_uring_wait_cqe.restype = ctypes.c_int
+    lib.io_uring_peek_cqe.argtypes = [vp, ctypes.POINTER(ctypes.POINTER(_Cqe))]
+    lib.io_uring_peek_cqe.restype = ctypes.c_int
+    lib.io_uring_cqe_seen.argtypes = [vp, ctypes.POINTER(_Cqe)]
+    lib.io_uring_cqe_seen.restype = None
+    return lib
+
+
+_lib = _load_liburing()
+
+
+def _retry(fn, *args):
+    # ring calls return -errno; EINTR only means a signal arrived while waiting
+    while True:
+        ret = fn(*args)
+        if ret != -errno.EINTR:
+            break
+    if ret < 0:
+        raise OSError(-ret, os.strerror(-ret))
+    return ret
+
+
+def _submit_and_reap(ring, count, done):
+    """Submit queued SQEs, appending ``(user_data, res)`` to ``done`` for
+    each completion.
+
+    Raises OSError if the ring itself fails (not for per-request errors,
+    which come back as a negative ``res``); ``done`` then holds every
+    completion that had arrived, so the caller can release what they hold.
+    """
+    if not count:
+        return done
+    cqe = ctypes.POINTER(_Cqe)()
+    try:
+        _retry(_lib.io_uring_submit_and_wait, ring, count)
+        for _ in range(count):
+            _retry(_lib.io_uring_wait_cqe, ring, ctypes.byref(cqe))
+            done.append((cqe.contents.user_data, cqe.contents.res))
+            _lib.io_uring_cqe_seen(ring, cqe)
+    except OSError:
+        # collect completions that are ready without waiting for more
+        while _lib.io_uring_peek_cqe(ring, ctypes.byref(cqe)) == 0:
+            done.append((cqe.contents.user_data, cqe.contents.res))
+            _lib.io_uring_cqe_seen(ring, cqe)
+        raise
+    return done
+
+
+def _read_batch(ring, paths):
+    """Read at most ``QUEUE_DEPTH`` files; returns bytes or OSError per path.
+
+    Raises OSError if the ring fails; any files it opened are closed first.
+    """
+    results = [None] * len(paths)
+    sizes = [0] * len(paths)
+    for i, p in enumerate(paths):
+        try:
+            sizes[i] = os.stat(p).st_size
+        except OSError as e:
+            results[i] = e
+            continue
+        if not sizes[i]:
+            # empty, or a pseudo-file whose size stat can't report
+            results[i] = _read_plain(p)
+
+    fds = {}
+    opened = []
+    closed = []
+    try:
+        # phase 1: openat
+        names = [os.fsencode(p) for p in paths]
+        pending = [i for i in range(len(paths)) if results[i] is None]
+        for i in pending:
+            sqe = _lib.io_uring_get_sqe(ring)
+            _lib.io_uring_prep_openat(sqe, AT_FDCWD, names[i], os.O_RDONLY, 0)
+            _lib.io_uring_sqe_set_data64(sqe, i)
+        # opened and closed are filled as completions are reaped, so after
+        # a ring failure they still say which fds need closing
+        for i, res in _submit_and_reap(ring, len(pending), opened):
+            if res < 0:
+                results[i] = OSError(-res, os.strerror(-res), paths[i])
+            else:
+                fds[i] = res
+
+        # phase 2: read into buffers sized from the stat above; short reads
+        # are resumed at the offset reached until EOF or the buffer is full
+        bufs = {i: bytearray(sizes[i]) for i in fds}
+        views = {i: (ctypes.c_char * sizes[i]).from_buffer(bufs[i]) for i in fds}
+        got = dict.fromkeys(fds, 0)
+        todo = set(fds)
+        while todo:
+            for i in todo:
+                sqe = _lib.io_uring_get_sqe(ring)
+                _lib.io_uring_prep_read(sqe, fds[i], ctypes.addressof(views[i]) + got[i],
+                                        sizes[i] - got[i], got[i])
+                _lib.io_uring_sqe_set_data64(sqe, i)
+            for i, res in _submit_and_reap(ring, len(todo), []):
+                if res in (-errno.EINTR, -errno.EAGAIN):
+                    continue
+                if res < 0:
+                    results[i] = OSError(-res, os.strerror(-res), paths[i])
+                    todo.discard(i)
+                elif res == 0:
+                    # EOF: the file shrank between stat and read
+                    todo.discard(i)
+                else:
+                    got[i] += res
+                    if got[i] == sizes[i]:
+                        todo.discard(i)
+        # drop the ctypes views so the bytearrays can be resized
+        views.clear()
+        for i, buf in bufs.items():
+            if results[i] is None:
+                del buf[got[i]:]
+                results[i] = buf
+
+        # phase 3: close
+        for i, fd in fds.items():
+            sqe = _lib.io_uring_get_sqe(ring)
+            _lib.io_uring_prep_close(sqe, fd)
+            _lib.io_uring_sqe_set_data64(sqe, i)
+        _submit_and_reap(ring, len(fds), closed)
+    except OSError:
+        done = {i for i, res in closed if res == 0}
+        for i, fd in opened:
+            if fd < 0 or i in done:
+                continue
+            try:
+                os.close(fd)
+            except OSError:
+                # the fd is released even when close reports an error;
+                # re-raise the ring failure, not this
+                pass
+        raise
+
+    return results
+
+
+def _read_plain(path):
+    try:
+        with open(path, "rb") as fh:
+            return fh.read()
+    except OSError as e:
+        return e
+
+
+def read_files(paths):
+    """Yield ``(path, data)`` for each path, in order.
+
+    ``data`` is the file's bytes, or the ``OSError`` hit while reading it so
+    callers can record per-file failures without aborting the whole batch.
+    """
+    paths = list(paths)
+    ring = None
+    if _lib is not None:
+        ring = ctypes.create_string_buffer(_RING_SIZE)
+        if _lib.io_uring_queue_init(QUEUE_DEPTH, ring, 0) < 0:
+            # io_uring disabled (seccomp, sysctl, old kernel)
+            ring = None
+
+    if ring is None:
+        for p in paths:
+            yield p, _read_plain(p)
+        return
+
+    start = 0
+    try:
+        while start < len(paths):
+            chunk = paths[start:start + QUEUE_DEPTH]
+            try:
+                results = _read_batch(ring, chunk)
+            except OSError:
+                # the ring itself failed; read this chunk and the rest plainly
+                break
+            yield from zip(chunk, results)
+            start += QUEUE_DEPTH
+    finally:
+        _lib.io_uring_queue_exit(ring)
+
+    for p in paths[start:]:
+        yield p, _read_plain(p)
@@ -1,19 +1,262 @@
+import fnmatch
 import json
+import mmap
+import re
 import sys
 import glob
 import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import orjson
+except ImportError:  # optional; dumps_json falls back to the json module
+    orjson = None
+
+from edi_io_uring import read_files
+
+
+# Field names for each known segment, in element order (element 1 first).
+# A None entry skips that element position. Builders are compiled once per
+# id (_make_builder); don't loop over this table per call.
+SEGMENT_SCHEMA = {
+    "NM1": (
+        "entity_identifier_code",
+        "entity_type_qualifier",
+        "name_last_or_organization",
+        "name_first",
+        "name_middle",
+    ),
+    # Add more fields based on the ISA segment specification
+    "ISA": (
+        "authorization_information_qualifier",
+        "authorization_information",
+        "security_information_qualifier",
+        "security_information",
+        None,
+        "interchange_sender_id",
+        "interchange_receiver_id",
+    ),
+    # Add more fields based on the GS segment specification
+    "GS": (
+        "functional_group_code",
+        "application_sender_code",
+        "application_receiver_code",
+    ),
+    "ST": (
+        "transaction_set_identifier_code",
+        "transaction_set_control_number",
+    ),
+    "BHT": (
+        "hierarchical_structure_code",
+        "transaction_set_purpose_code",
+        "reference_identification",
+        "date",
+        "time",
+        "transaction_type_code",
+    ),
+    "PER": (
+        "contact_function_code",
+        "name",
+        "comm_qual_1",
+        "comm_number_1",
+        "comm_qual_2",
+        "comm_number_2",
+    ),
+    "HL": (
+        "hierarchical_id_number",
+        "hierarchical_parent_id_number",
+        "hierarchical_level_code",
+        "hierarchical_child_code",
+    ),
+    "N3": (
+        "address_line_1",
+        "address_line_2",
+    ),
+    "N4": (
+        "city",
+        "state",
+        "postal_code",
+    ),
+    "REF": (
+        "reference_id_qualifier",
+        "reference_id",
+    ),
+    "SBR": (
+        "payer_relationship_code",
+        "benefit_status_code",
+        "insurance_type_code",
+        "coordination_of_benefits",
+        "group_number",
+    ),
+    "DMG": (
+        "date_time_qualifier",
+        "birth_date",
+        "gender",
+    ),
+    "CLM": (
+        "patient_control_number",
+        "monetary_amount",
+        "filling_indicator",
+        "place_of_service",
+        "facility_type_code",
+    ),
+    "PRV": (
+        "provider_code",
+        "provider_qualifier",
+        "provider_value",
+    ),
+    "LX": (
+        "assigned_number",
+    ),
+    "DTP": (
+        "date_time_qualifier",
+        "date_time_period_format_qualifier",
+        "date_time_period",
+    ),
+    "SE": (
+        "number_of_included_segments",
+        "transaction_set_control_number",
+    ),
+}
+
+# Files at least this large are parsed through mmap; below it a plain read()
+# is cheaper than setting up the mapping.
+MMAP_THRESHOLD = 64 * 1024
+
+# The CLIs only fan out to worker processes for at least this many files,
+# and only with more than one CPU. Shipping each result back to the parent
+# costs more than parsing a typical file, so small batches run in-process.
+PARALLEL_MIN_FILES = 256
+
+
+def usable_cpus():
+    # CPUs this process may run on; os.cpu_count() ignores affinity masks
+    # and cpusets
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available outside Linux
+        return os.cpu_count() or 1
+
+
+def pool_map(fn, files, workers):
+    # Run fn(path) for every file in worker processes; returns {path: result}
+    # in file order. fn must not raise. If a worker dies (OOM kill, crash)
+    # the pool breaks, and every file without a result gets an error entry
+    # instead of the whole run being lost.
+    results = {}
+    # a few chunks per worker: amortizes per-task IPC, still balances load
+    chunksize = max(1, len(files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        try:
+            for fp, res in zip(files, ex.map(fn, files, chunksize=chunksize)):
+                results[fp] = res
+        except BrokenProcessPool as e:
+            for fp in files:
+                results.setdefault(fp, {"error": str(e)})
+    return results
+
+
+def _decode(buf):
+    # buf may be any buffer, including an mmap. X12 content is ASCII in
+    # practice, which UTF-8 decodes at memcpy speed; latin-1 keeps files with
+    # stray non-UTF-8 bytes parseable.
+    try:
+        return str(buf, "utf-8")
+    except UnicodeDecodeError:
+        return str(buf, "latin-1")
+
+
+def dumps_json(obj):
+    # Indented JSON as bytes; orjson's C encoder when available
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+
+
+# Characters that make a path component a pattern, as glob treats them
+_GLOB_MAGIC = re.compile(r"[*?[]")
+
+
+def expand_paths(pattern, sort=False):
+    # Resolve a CLI path argument to a list of files. A real file is used
+    # as-is. A wildcard in the last component only is matched in a single
+    # os.scandir pass (dirent types, no per-entry stat); anything else is
+    # left to glob. Order is directory order unless sort is set.
+    if os.path.isfile(pattern):
+        return [pattern]
+    d, pat = os.path.split(pattern)
+    if _GLOB_MAGIC.search(d) or not _GLOB_MAGIC.search(pat):
+        files = glob.glob(pattern)
+    else:
+        # like glob, wildcards don't match hidden files, and matching is
+        # case-insensitive on Windows (fnmatch applies os.path.normcase)
+        hidden_ok = pat.startswith(".")
+        try:
+            with os.scandir(d or ".") as it:
+                files = [
+                    os.path.join(d, e.name) for e in it
+                    if (hidden_ok or not e.name.startswith("."))
+                    and fnmatch.fnmatch(e.name, pat) and e.is_file()
+                ]
+        except OSError:
+            files = []
+    if sort:
+        files.sort()
+    return files
+
+
+# Per-segment-id mapping functions, generated from SEGMENT_SCHEMA on first use.
+_BUILDERS = {}
+
+
+def _make_builder(schema):
+    # Generate a function returning the mapped dict as a single literal, so
+    # each call does no per-field looping. Segments with every schema field
+    # present (the common case) skip the per-field length checks entirely.
+    present = ", ".join(f"{k!r}: f[{i + 1}]" for i, k in enumerate(schema) if k)
+    padded = ", ".join(f"{k!r}: f[{i + 1}] if n > {i + 1} else None" for i, k in enumerate(schema) if k)
+    src = (
+        "def _b(f):\n"
+        "    n = len(f)\n"
+        f"    if n > {len(schema)}:\n"
+        f"        return {{{present}}}\n"
+        f"    return {{{padded}}}\n"
+    )
+    ns = {}
+    exec(compile(src, "<segment builder>", "exec"), ns)
+    return ns["_b"]
+
+
 
 class EDIParserAgent:
-    def __init__(self, delimiter="*"):
+    def __init__(self, delimiter="*", keep_raw=False):
         self.delimiter = delimiter
+        # keep_raw: also store each segment's original ordered field list
+        # under the reserved '_raw' key, for consumers that need positional
+        # access (the root-cause agent). Off by default to keep output lean.
+        self.keep_raw = keep_raw
         self.segments = {}
         
-    def parse_edi(self, edi_file_path):
+    def parse_edi(self, edi_file_path, segment_filter=None):
+        with open(edi_file_path, 'rb') as edi_file:
+            if os.fstat(edi_file.fileno()).st_size < MMAP_THRESHOLD:
+                return self.parse_edi_bytes(edi_file.read(), segment_filter)
+            # large file: decode straight from the page cache rather
+            # than copying it into a bytes object first
+            with mmap.mmap(edi_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return self.parse_edi_bytes(mm, segment_filter)
+
+    def parse_edi_bytes(self, buf, segment_filter=None):
+        # segment_filter: optional set of segment ids to keep; segments with
+        # other ids are skipped before any mapping work. None keeps all.
         # reset state for each file parsed
         self.segments = {}
+        segs = defaultdict(list)
+        map_fn = self.map_segment_data
 
-        with open(edi_file_path, 'r') as edi_file:
-            edi_content = edi_file.read()
+        edi_content = _decode(buf)
 
         # Split the content by the standard segment terminator (~)
         raw_segments = edi_content.split("~")
@@ -30,153 +273,59 @@ class EDIParserAgent:
             segment_id = segment_fields[0].strip()
             if not segment_id:
                 continue
-
-            if segment_id not in self.segments:
-                self.segments[segment_id] = []
+            # ids repeat on every segment; interned, dict probes on them
+            # (segs, SEGMENT_SCHEMA, _BUILDERS) hit on identity
+            segment_id = sys.intern(segment_id)
+            if segment_filter is not None and segment_id not in segment_filter:
+                continue
 
             # Map the fields to the segment's respective key-value pairs
-            segment_data = self.map_segment_data(segment_id, segment_fields)
-
-            # Append the parsed segment data
-            self.segments[segment_id].append(segment_data)
+            # and append the parsed segment data
+            segs[segment_id].append(map_fn(segment_id, segment_fields))
 
+        # plain dict for callers; a defaultdict would grow keys on lookup
+        self.segments = dict(segs)
         return self.segments
 
     def map_segment_data(self, segment_id, fields):
-        # Here we will define how each segment is mapped. 
-        # For example, for the NM1 segment, it might be:
-        if segment_id == "NM1":
-            return {
-                "entity_identifier_code": fields[1],
-                "entity_type_qualifier": fields[2],
-                "name_last_or_organization": fields[3],
-                "name_first": fields[4] if len(fields) > 4 else None,
-                "name_middle": fields[5] if len(fields) > 5 else None,
-            }
-        elif segment_id == "ISA":
-            return {
-                "authorization_information_qualifier": fields[1],
-                "authorization_information": fields[2],
-                "security_information_qualifier": fields[3],
-                "security_information": fields[4],
-                "interchange_sender_id": fields[6],
-                "interchange_receiver_id": fields[7],
-                # Add more fields based on the ISA segment specification
-            }
-        elif segment_id == "GS":
-            return {
-                "functional_group_code": fields[1],
-                "application_sender_code": fields[2],
-                "application_receiver_code": fields[3],
-                # Add more fields based on the GS segment specification
-            }
-        elif segment_id == "ST":
-            return {
-                "transaction_set_identifier_code": fields[1] if len(fields) > 1 else None,
-                "transaction_set_control_number": fields[2] if len(fields) > 2 else None,
-            }
-        elif segment_id == "BHT":
-            return {
-                "hierarchical_structure_code": fields[1] if len(fields) > 1 else None,
-                "transaction_set_purpose_code": fields[2] if len(fields) > 2 else None,
-                "reference_identification": fields[3] if len(fields) > 3 else None,
-                "date": fields[4] if len(fields) > 4 else None,
-                "time": fields[5] if len(fields) > 5 else None,
-                "transaction_type_code": fields[6] if len(fields) > 6 else None,
-            }
-        elif segment_id == "PER":
-            return {
-                "contact_function_code": fields[1] if len(fields) > 1 else None,
-                "name": fields[2] if len(fields) > 2 else None,
-                "comm_qual_1": fields[3] if len(fields) > 3 else None,
-                "comm_number_1": fields[4] if len(fields) > 4 else None,
-                "comm_qual_2": fields[5] if len(fields) > 5 else None,
-                "comm_number_2": fields[6] if len(fields) > 6 else None,
-            }
-        elif segment_id == "HL":
-            return {
-                "hierarchical_id_number": fields[1] if len(fields) > 1 else None,
-                "hierarchical_parent_id_number": fields[2] if len(fields) > 2 else None,
-                "hierarchical_level_code": fields[3] if len(fields) > 3 else None,
-                "hierarchical_child_code": fields[4] if len(fields) > 4 else None,
-            }
-        elif segment_id == "N3":
-            return {
-                "address_line_1": fields[1] if len(fields) > 1 else None,
-                "address_line_2": fields[2] if len(fields) > 2 else None,
-            }
-        elif segment_id == "N4":
-            return {
-                "city": fields[1] if len(fields) > 1 else None,
-                "state": fields[2] if len(fields) > 2 else None,
-                "postal_code": fields[3] if len(fields) > 3 else None,
-            }
-        elif segment_id == "REF":
-            return {
-                "reference_id_qualifier": fields[1] if len(fields) > 1 else None,
-                "reference_id": fields[2] if len(fields) > 2 else None,
-            }
-        elif segment_id == "SBR":
-            return {
-                "payer_relationship_code": fields[1] if len(fields) > 1 else None,
-                "benefit_status_code": fields[2] if len(fields) > 2 else None,
-                "insurance_type_code": fields[3] if len(fields) > 3 else None,
-                "coordination_of_benefits": fields[4] if len(fields) > 4 else None,
-                "group_number": fields[5] if len(fields) > 5 else None,
-            }
-        elif segment_id == "DMG":
-            return {
-                "date_time_qualifier": fields[1] if len(fields) > 1 else None,
-                "birth_date": fields[2] if len(fields) > 2 else None,
-                "gender": fields[3] if len(fields) > 3 else None,
-            }
-        elif segment_id == "CLM":
-            return {
-                "patient_control_number": fields[1] if len(fields) > 1 else None,
-                "monetary_amount": fields[2] if len(fields) > 2 else None,
-                "filling_indicator": fields[3] if len(fields) > 3 else None,
-                "place_of_service": fields[4] if len(fields) > 4 else None,
-                "facility_type_code": fields[5] if len(fields) > 5 else None,
-            }
+        builder = _BUILDERS.get(segment_id)
+        if builder is None and segment_id in SEGMENT_SCHEMA:
+            builder = _BUILDERS[segment_id] = _make_builder(SEGMENT_SCHEMA[segment_id])
+        if builder is not None:
+            # positional fields beyond the end of the segment map to None
+            data = builder(fields)
         elif segment_id == "HI":
             # HI often contains composite diagnosis/procedure codes; return raw and parsed where possible
-            return {
+            data = {
                 "hi_all": fields[1:] if len(fields) > 1 else [],
             }
-        elif segment_id == "PRV":
-            return {
-                "provider_code": fields[1] if len(fields) > 1 else None,
-                "provider_qualifier": fields[2] if len(fields) > 2 else None,
-                "provider_value": fields[3] if len(fields) > 3 else None,
-            }
-        elif segment_id == "LX":
-            return {
-                "assigned_number": fields[1] if len(fields) > 1 else None,
-            }
         elif segment_id == "SV1":
             # Service line with potentially colon-separated product/service id
             svc_id = fields[1] if len(fields) > 1 else None
             svc_parts = svc_id.split(":") if svc_id else []
-            return {
+            data = {
                 "composite_med_proc_id": svc_id,
                 "composite_med_proc_id_parts": svc_parts,
                 "charge_amount": fields[2] if len(fields) > 2 else None,
                 "unit_measure": fields[3] if len(fields) > 3 else None,
                 "service_unit_count": fields[4] if len(fields) > 4 else None,
             }
-        elif segment_id == "DTP":
-            return {
-                "date_time_qualifier": fields[1] if len(fields) > 1 else None,
-                "date_time_period_format_qualifier": fields[2] if len(fields) > 2 else None,
-                "date_time_period": fields[3] if len(fields) > 3 else None,
-            }
-        elif segment_id == "SE":
-            return {
-                "number_of_included_segments": fields[1] if len(fields) > 1 else None,
-                "transaction_set_control_number": fields[2] if len(fields) > 2 else None,
-            }
         else:
-            return {f"field_{i}": field for i, field in enumerate(fields)}
+            data = {f"field_{i}": field for i, field in enumerate(fields)}
+
+        if self.keep_raw:
+            # same list, no copy
+            data["_raw"] = fields
+        return data
+
+
+def _parse_path(fp):
+    # ProcessPoolExecutor worker for the CLI; errors are reported per file
+    try:
+        return EDIParserAgent().parse_edi(fp)
+    except Exception as e:
+        return {"error": str(e)}
+
 
 # Example usage
 if __name__ == "__main__":
@@ -186,15 +335,22 @@ if __name__ == "__main__":
     all_results = {}
 
     # expand glob; if the pattern points to a real file, use it
-    files = glob.glob(path)
-    if not files and os.path.isfile(path):
-        files = [path]
+    files = expand_paths(path)
 
-    for fp in files:
-        try:
-            parsed = parser_agent.parse_edi(fp)
-            all_results[fp] = parsed
-        except Exception as e:
-            all_results[fp] = {"error": str(e)}
+    workers = usable_cpus()
+    if len(files) < PARALLEL_MIN_FILES or workers < 2:
+        # read the whole batch up front (io_uring on Linux), then parse
+        # from memory
+        for fp, content in read_files(files):
+            if isinstance(content, OSError):
+                all_results[fp] = {"error": str(content)}
+                continue
+            try:
+                all_results[fp] = parser_agent.parse_edi_bytes(content)
+            except Exception as e:
+                all_results[fp] = {"error": str(e)}
+    else:
+        # workers get paths, not bytes, so the parent never holds the dataset
+        all_results = pool_map(_parse_path, files, workers)
 
-    print(json.dumps(all_results, indent=4))
+    sys.stdout.buffer.write(dumps_json(all_results) + b"\n")
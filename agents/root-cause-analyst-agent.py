@@ -9,21 +9,38 @@ Usage:
   python agents/root-cause-analyst-agent.py --path agents/835-files/* --output summary.json
 """
 import argparse
-import glob
-import json
 import csv
-import os
+import re
+import sys
+from itertools import zip_longest
 from typing import Dict, List, Any
 
-from parser_agent import EDIParserAgent
+from parser_agent import EDIParserAgent, PARALLEL_MIN_FILES, dumps_json, expand_paths, pool_map, usable_cpus
+from edi_io_uring import read_files
+
+# Plausible remark code: 3 digits, or 2+ chars containing at least one letter
+# (e.g. 'M123'). Matched with fullmatch.
+_CODE_RE = re.compile(r"\d{3}|(?=.{2}).*[^\W\d_].*", re.DOTALL)
+
+# Segments searched generically for remark codes. REF is deliberately absent:
+# its qualifiers and reference ids look like codes but never are.
+_GENERIC_SEGMENTS = ("NTE", "K3", "PLB")
+
+# Every segment extract_codes looks at; the parser skips all others
+_NEEDED_SEGMENTS = frozenset(("CAS", "LQ") + _GENERIC_SEGMENTS)
 
 
 def _fields_from_segment(seg: Dict[str, Any]) -> List[Any]:
-    """Reconstruct ordered fields from a parsed segment dict.
+    """Return the ordered fields of a parsed segment dict.
 
-    The parser returns keys like 'field_0','field_1',... for unknown
-    segments. This helper returns a list of values ordered by index.
+    A parser created with keep_raw=True keeps the original field list
+    (segment id first) under the reserved '_raw' key of every segment.
+    Without it, the list is rebuilt from the 'field_0','field_1',... keys
+    the parser uses for unknown segments (empty for schema segments).
     """
+    raw = seg.get("_raw")
+    if raw is not None:
+        return raw
     idxs = []
     for k in seg.keys():
         if k.startswith("field_"):
@@ -37,32 +54,43 @@ def _fields_from_segment(seg: Dict[str, Any]) -> List[Any]:
     return [seg.get(f"field_{i}") for i in range(0, max_i + 1)]
 
 
-def extract_codes(segments: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+def extract_codes(segments: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Any]]:
     """Extract CARC and RARC candidate codes from parsed segments.
 
-    Returns dict with keys: 'carc' and 'rarc', each a list of entries.
-    Each entry contains at least: file_segment, code, amount (if available), and raw_fields.
+    Works on the output of any EDIParserAgent; one created with
+    keep_raw=True skips rebuilding each segment's field list.
+
+    Returns dict with keys: 'carc', 'rarc' and 'raw_segments'. 'carc' and
+    'rarc' are lists of entries, each containing at least: segment, code,
+    amount (CARC, if available), and raw_id. The fields of the segment an
+    entry came from are stored once per segment, at
+    result['raw_segments'][entry['raw_id']].
     """
     carc_list = []
     rarc_list = []
+    raw_segments = []
 
     # CAS segments commonly contain CARC codes: CAS*group*REASON1*AMT1*REASON2*AMT2...
+    carc_append = carc_list.append
     for cas in segments.get("CAS", []):
         fields = _fields_from_segment(cas)
         if not fields:
             continue
         group = fields[1] if len(fields) > 1 else None
-        # reason codes typically start at index 2, paired with amounts
-        for i in range(2, len(fields), 2):
-            code = fields[i] if i < len(fields) else None
-            amount = fields[i + 1] if (i + 1) < len(fields) else None
+        raw_id = None
+        # reason codes typically start at index 2, paired with amounts;
+        # a trailing code without an amount pairs with None
+        for code, amount in zip_longest(fields[2::2], fields[3::2]):
             if code:
-                carc_list.append({
+                if raw_id is None:
+                    raw_id = len(raw_segments)
+                    raw_segments.append(fields)
+                carc_append({
                     "segment": "CAS",
                     "group": group,
                     "code": code,
                     "amount": amount,
-                    "raw": fields,
+                    "raw_id": raw_id,
                 })
 
     # LQ segments often carry remark codes (RARC/MISC). LQ*qualifier*code
@@ -75,36 +103,45 @@ def extract_codes(segments: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[D
                 "segment": "LQ",
                 "qualifier": qualifier,
                 "code": code,
-                "raw": fields,
+                "raw_id": len(raw_segments),
             })
-
-    # Some implementations place remark codes in other segments (e.g., REF, NTE)
-    # Search generically for plausible-looking codes (alphanumeric like 'M123' or 3-digit numeric)
-    def _search_generic_for_codes(seg_name: str):
-        for seg in segments.get(seg_name, []):
+            raw_segments.append(fields)
+
+    # Some implementations place remark codes in other segments (e.g., NTE)
+    # Search generically for plausible-looking codes (alphanumeric like 'M123' or 3-digit numeric),
+    # reporting each code at most once per segment name
+    seen = set()
+    for seg_name in _GENERIC_SEGMENTS:
+        for seg in segments.get(seg_name, ()):
             fields = _fields_from_segment(seg)
+            raw_id = None
             for f in fields[1:]:
-                if not f:
+                if not f or not _CODE_RE.fullmatch(f):
+                    continue
+                key = (seg_name, f)
+                if key in seen:
                     continue
-                # simple heuristics:
-                if (len(f) == 3 and f.isdigit()) or (len(f) >= 2 and any(c.isalpha() for c in f)):
-                    # treat as remark-like candidate if not already captured
-                    rarc_list.append({
-                        "segment": seg_name,
-                        "code": f,
-                        "raw": fields,
-                    })
+                seen.add(key)
+                if raw_id is None:
+                    raw_id = len(raw_segments)
+                    raw_segments.append(fields)
+                rarc_list.append({
+                    "segment": seg_name,
+                    "code": f,
+                    "raw_id": raw_id,
+                })
 
-    for seg_name in ("REF", "NTE", "K3", "PLB"):
-        _search_generic_for_codes(seg_name)
+    return {"carc": carc_list, "rarc": rarc_list, "raw_segments": raw_segments}
 
-    return {"carc": carc_list, "rarc": rarc_list}
+
+# One parser per process (pool workers get their own copy, by fork or by
+# re-import); parse_edi resets its state on every call.
+_PARSER = EDIParserAgent(keep_raw=True)
 
 
 def analyze_file(fp: str) -> Dict[str, Any]:
-    parser = EDIParserAgent()
     try:
-        segments = parser.parse_edi(fp)
+        segments = _PARSER.parse_edi(fp, segment_filter=_NEEDED_SEGMENTS)
     except Exception as e:
         return {"error": str(e)}
 
@@ -112,51 +149,58 @@ def analyze_file(fp: str) -> Dict[str, Any]:
     return codes
 
 
+def analyze_bytes(content: bytes) -> Dict[str, Any]:
+    """Like `analyze_file`, for file content that has already been read."""
+    try:
+        segments = _PARSER.parse_edi_bytes(content, segment_filter=_NEEDED_SEGMENTS)
+    except Exception as e:
+        return {"error": str(e)}
+
+    return extract_codes(segments)
+
+
+def _analyze_path(fp: str) -> Dict[str, Any]:
+    # pool worker: never raise, so one bad file can't abort the whole map
+    try:
+        return analyze_file(fp)
+    except Exception as e:
+        return {"error": str(e)}
+
+
 def analyze_folder(path_pattern: str) -> Dict[str, Any]:
     results = {}
-    files = glob.glob(path_pattern)
-    if not files and os.path.isfile(path_pattern):
-        files = [path_pattern]
-
-    for fp in files:
-        try:
-            results[fp] = analyze_file(fp)
-        except Exception as e:
-            results[fp] = {"error": str(e)}
+    files = expand_paths(path_pattern)
+
+    workers = usable_cpus()
+    if len(files) < PARALLEL_MIN_FILES or workers < 2:
+        # batch the reads (io_uring on Linux) and analyze from memory
+        for fp, content in read_files(files):
+            if isinstance(content, OSError):
+                results[fp] = {"error": str(content)}
+                continue
+            try:
+                results[fp] = analyze_bytes(content)
+            except Exception as e:
+                results[fp] = {"error": str(e)}
+        return results
 
-    return results
+    # workers get paths, not bytes, so the parent never holds the dataset;
+    # files are independent so this scales with cores
+    return pool_map(_analyze_path, files, workers)
 
 
 def write_csv_from_results(results: Dict[str, Any], csv_path: str):
-    rows = []
-    for fp, dat in results.items():
-        if not isinstance(dat, dict):
-            continue
-        for c in dat.get("carc", []):
-            rows.append({
-                "file": fp,
-                "segment": c.get("segment"),
-                "type": "CARC",
-                "code": c.get("code"),
-                "amount": c.get("amount"),
-                "qualifier": c.get("group"),
-            })
-        for r in dat.get("rarc", []):
-            rows.append({
-                "file": fp,
-                "segment": r.get("segment"),
-                "type": "RARC",
-                "code": r.get("code"),
-                "amount": None,
-                "qualifier": r.get("qualifier"),
-            })
-
-    fieldnames = ["file", "segment", "type", "code", "amount", "qualifier"]
+    # rows are written as they are produced rather than collected first
     with open(csv_path, "w", newline="") as fh:
-        writer = csv.DictWriter(fh, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+        writer = csv.writer(fh)
+        writer.writerow(["file", "segment", "type", "code", "amount", "qualifier"])
+        for fp, dat in results.items():
+            if not isinstance(dat, dict):
+                continue
+            for c in dat.get("carc", ()):
+                writer.writerow([fp, c.get("segment"), "CARC", c.get("code"), c.get("amount"), c.get("group")])
+            for r in dat.get("rarc", ()):
+                writer.writerow([fp, r.get("segment"), "RARC", r.get("code"), None, r.get("qualifier")])
 
 
 def main():
@@ -169,11 +213,11 @@ def main():
     results = analyze_folder(args.path)
 
     if args.output:
-        with open(args.output, "w") as fh:
-            json.dump(results, fh, indent=2)
+        with open(args.output, "wb") as fh:
+            fh.write(dumps_json(results))
         print(f"Wrote JSON summary to {args.output}")
     else:
-        print(json.dumps(results, indent=2))
+        sys.stdout.buffer.write(dumps_json(results) + b"\n")
 
     if args.csv:
         write_csv_from_results(results, args.csv)
@@ -0,0 +1,174 @@
+import ctypes
+import errno
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "agents"))
+
+import edi_io_uring  # noqa: E402
+
+
+class FakeUring:
+    """In-process stand-in for liburing-ffi that runs each SQE with os calls.
+
+    Knobs: ``eintr`` EINTR returns to inject into io_uring_wait_cqe,
+    ``max_read`` cap on bytes per read SQE (forces short reads),
+    ``fail_reads`` make submitting read SQEs fail the whole ring with EIO,
+    ``fail_wait`` an ``(op, n)`` pair: io_uring_wait_cqe fails with EIO once
+    ``n`` completions of that op have been reaped.
+    """
+
+    def __init__(self, eintr=0, max_read=None, fail_reads=False, fail_wait=None):
+        self.eintr = eintr
+        self.max_read = max_read
+        self.fail_reads = fail_reads
+        self.fail_wait = fail_wait
+        self.reaped = {}
+        self.sqes = []
+        self.cq = []
+        self.opened = []
+
+    def io_uring_queue_init(self, entries, ring, flags):
+        return 0
+
+    def io_uring_queue_exit(self, ring):
+        pass
+
+    def io_uring_get_sqe(self, ring):
+        sqe = {}
+        self.sqes.append(sqe)
+        return sqe
+
+    def io_uring_prep_openat(self, sqe, dfd, path, flags, mode):
+        sqe.update(op="open", path=path, flags=flags)
+
+    def io_uring_prep_read(self, sqe, fd, addr, nbytes, offset):
+        sqe.update(op="read", fd=fd, addr=addr, nbytes=nbytes, offset=offset)
+
+    def io_uring_prep_close(self, sqe, fd):
+        sqe.update(op="close", fd=fd)
+
+    def io_uring_sqe_set_data64(self, sqe, data):
+        sqe["data"] = data
+
+    def io_uring_submit_and_wait(self, ring, count):
+        if self.fail_reads and any(sqe["op"] == "read" for sqe in self.sqes):
+            self.sqes = []
+            return -errno.EIO
+        for sqe in self.sqes:
+            self.cq.append((sqe["data"], self._run(sqe), sqe["op"]))
+        self.sqes = []
+        return count
+
+    def _run(self, sqe):
+        try:
+            if sqe["op"] == "open":
+                fd = os.open(sqe["path"], sqe["flags"])
+                self.opened.append(fd)
+                return fd
+            if sqe["op"] == "read":
+                n = min(sqe["nbytes"], self.max_read or sqe["nbytes"])
+                data = os.pread(sqe["fd"], n, sqe["offset"])
+                ctypes.memmove(sqe["addr"], data, len(data))
+                return len(data)
+            os.close(sqe["fd"])
+            return 0
+        except OSError as e:
+            return -e.errno
+
+    def io_uring_wait_cqe(self, ring, cqe_ref):
+        if self.eintr:
+            self.eintr -= 1
+            return -errno.EINTR
+        if self.fail_wait:
+            op, n = self.fail_wait
+            if self.cq[0][2] == op and self.reaped.get(op, 0) >= n:
+                return -errno.EIO
+        return self.io_uring_peek_cqe(ring, cqe_ref)
+
+    def io_uring_peek_cqe(self, ring, cqe_ref):
+        if not self.cq:
+            return -errno.EAGAIN
+        data, res, _ = self.cq[0]
+        self._cqe = edi_io_uring._Cqe(data, res, 0)
+        cqe_ref._obj.contents = self._cqe
+        return 0
+
+    def io_uring_cqe_seen(self, ring, cqe):
+        op = self.cq.pop(0)[2]
+        self.reaped[op] = self.reaped.get(op, 0) + 1
+
+
+class ReadFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.paths = []
+        for i in range(edi_io_uring.QUEUE_DEPTH + 5):
+            p = os.path.join(self.tmp.name, f"f{i}.edi")
+            with open(p, "wb") as fh:
+                fh.write(b"ST*837*%04d~SE*1*%04d~" % (i, i) * (i + 1))
+            self.paths.append(p)
+        self.missing = os.path.join(self.tmp.name, "missing.edi")
+
+    def expected(self, p):
+        with open(p, "rb") as fh:
+            return fh.read()
+
+    def read_with(self, fake):
+        with mock.patch.object(edi_io_uring, "_lib", fake):
+            return list(edi_io_uring.read_files(self.paths + [self.missing]))
+
+    def assert_results(self, got):
+        self.assertEqual([p for p, _ in got], self.paths + [self.missing])
+        for p, data in got[:-1]:
+            self.assertEqual(bytes(data), self.expected(p))
+        self.assertIsInstance(got[-1][1], FileNotFoundError)
+
+    def assert_all_closed(self, fake):
+        for fd in fake.opened:
+            with self.assertRaises(OSError):
+                os.fstat(fd)
+
+    def test_plain_fallback(self):
+        self.assert_results(self.read_with(None))
+
+    def test_batched(self):
+        fake = FakeUring()
+        self.assert_results(self.read_with(fake))
+        self.assertTrue(fake.opened)
+        self.assert_all_closed(fake)
+
+    def test_eintr_is_retried(self):
+        fake = FakeUring(eintr=3)
+        self.assert_results(self.read_with(fake))
+        self.assert_all_closed(fake)
+
+    def test_short_reads_resume_at_offset(self):
+        fake = FakeUring(max_read=7)
+        self.assert_results(self.read_with(fake))
+        self.assert_all_closed(fake)
+
+    def test_ring_failure_falls_back_and_closes_fds(self):
+        fake = FakeUring(fail_reads=True)
+        self.assert_results(self.read_with(fake))
+        self.assertTrue(fake.opened)
+        self.assert_all_closed(fake)
+
+    def test_ring_failure_while_opening_closes_fds(self):
+        fake = FakeUring(fail_wait=("open", 5))
+        self.assert_results(self.read_with(fake))
+        self.assertGreater(len(fake.opened), 5)
+        self.assert_all_closed(fake)
+
+    def test_ring_failure_while_closing_closes_fds(self):
+        fake = FakeUring(fail_wait=("close", 5))
+        self.assert_results(self.read_with(fake))
+        self.assert_all_closed(fake)
+
+
+if __name__ == "__main__":
+    unittest.main()